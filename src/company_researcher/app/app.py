@@ -1,9 +1,14 @@
-from fastapi import Depends, FastAPI
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Annotated
+from fastapi import FastAPI, Query, Request, Response
 import logging
-from fastapi.templating import Jinja2Templates
 import os
-from fastapi import Request 
+import httpx
+from fastapi.responses import HTMLResponse, StreamingResponse
+import orjson
 from fastapi.middleware.cors import CORSMiddleware
+from langchain_core.caches import InMemoryCache
 from langchain_openai import ChatOpenAI
 from company_researcher.core.agents import CompanyResearchAgent
 from company_researcher.core.api_clients.tavily_client import TavilyClient
@@ -16,14 +21,25 @@ load_dotenv(override=True)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the shared clients and compile the research graph before serving the first request.
+    # Endpoints read them from app.state, sync dependencies would be run in the threadpool on every request.
+    app.state.company_researcher = get_company_researcher()
+    app.state.mongo_logger = get_mongo_logger()
+    yield
+    await app.state.mongo_logger.close()
+    await get_openai_http_client().aclose()
+
+app = FastAPI(lifespan=lifespan)
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
 frontend_origin = os.getenv("FRONTEND_ORIGIN", "http://localhost:8000")
-allow_origins = list(set([
+# dict.fromkeys drops a duplicate frontend_origin while keeping a deterministic order
+allow_origins = list(dict.fromkeys([
     "http://localhost:8000",
     "http://127.0.0.1:8000",
     "http://localhost:3000",
@@ -39,43 +55,119 @@ app.add_middleware(
 )
 
 
-templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
+# The home page is static, read it once instead of rendering the template on every request
+with open(os.path.join(BASE_DIR, "templates", "index.html"), "rb") as f:
+    INDEX_HTML = f.read()
 
-@app.get("/")
-async def home(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+@app.get("/", response_class=HTMLResponse)
+async def home():
+    return HTMLResponse(content=INDEX_HTML)
 
 
 config = load_config()
-llm = ChatOpenAI(model = config.openai_model, temperature=config.llm_temperature)
-tavily_client = TavilyClient()
-company_researcher = CompanyResearchAgent(
-    llm=llm,
-    tavily_client=tavily_client,
-    config=config
-)
-mongo_logger = MongoLogger()
+
+
+# The clients and the compiled research graph hold no per-request state, so one instance of
+# each is shared by all requests in the process.
+@lru_cache(maxsize=1)
+def get_openai_http_client() -> httpx.AsyncClient:
+    # All llms share this client, size its connection pool for the concurrent agent calls so that
+    # keep-alive connections are reused instead of reconnecting under load.
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=config.llm_max_connections, max_keepalive_connections=config.llm_max_connections // 2)
+    )
+
+
+@lru_cache(maxsize=2)
+def get_llm(model: str) -> ChatOpenAI:
+    # Responses are only reproducible, and so only worth caching, when sampling is deterministic
+    cache_responses = config.llm_cache_max_size > 0 and config.llm_temperature == 0
+    return ChatOpenAI(
+        model=model,
+        temperature=config.llm_temperature,
+        http_async_client=get_openai_http_client(),
+        max_retries=2,
+        cache=InMemoryCache(maxsize=config.llm_cache_max_size) if cache_responses else None
+    )
+
+
+@lru_cache(maxsize=1)
+def get_company_researcher() -> CompanyResearchAgent:
+    tavily_client = TavilyClient(
+        max_concurrency=config.tavily_max_concurrency,
+        cache_ttl_seconds=config.tavily_cache_ttl_seconds
+    )
+    return CompanyResearchAgent(
+        llm=get_llm(config.openai_model),
+        tavily_client=tavily_client,
+        config=config,
+        research_llm=get_llm(config.openai_research_model or config.openai_model)
+    )
+
+
+@lru_cache(maxsize=1)
+def get_mongo_logger() -> MongoLogger:
+    return MongoLogger()
 
 
 @app.get("/api/research", response_model=GetResearchResponse)
-async def get_research(query: GetResearchRequest = Depends()):
-    logging.info(f"Received request for company: {query.company_name}, URL: {query.company_url}")
+async def get_research(request: Request, query: Annotated[GetResearchRequest, Query()]):
+    company_researcher: CompanyResearchAgent = request.app.state.company_researcher
+    mongo_logger: MongoLogger = request.app.state.mongo_logger
+    logging.info("Received request for company: %s, URL: %s", query.company_name, query.company_url)
     res = await company_researcher.perform_research(
         company_name=query.company_name,
         company_url=query.company_url
     )
 
-    mongo_logger.log_result(
+    await mongo_logger.log_result(
         company_name=query.company_name,
         company_url=query.company_url,
         result=res.model_dump()
     )
 
-    return GetResearchResponse(
+    # Returning a Response skips FastAPI's re-validation of the already validated result against
+    # response_model, which is kept for the API docs.
+    return Response(content=_to_response(res).model_dump_json(), media_type="application/json")
+
+
+@app.get("/api/research/stream")
+async def stream_research(request: Request, query: Annotated[GetResearchRequest, Query()]):
+    """Stream research progress as server-sent events.
+
+    Emits a "token" event for every llm token generated by the agents, a "step" event with
+    the report of each research agent as soon as it finishes, and a final "result" event with
+    the same payload as /api/research.
+    """
+    company_researcher: CompanyResearchAgent = request.app.state.company_researcher
+    mongo_logger: MongoLogger = request.app.state.mongo_logger
+    logging.info("Received streaming request for company: %s, URL: %s", query.company_name, query.company_url)
+
+    async def events():
+        async for event, data in company_researcher.stream_research(
+            company_name=query.company_name,
+            company_url=query.company_url
+        ):
+            if event == "result":
+                await mongo_logger.log_result(
+                    company_name=query.company_name,
+                    company_url=query.company_url,
+                    result=data.model_dump()
+                )
+                payload = _to_response(data).model_dump_json()
+            else:
+                payload = orjson.dumps(data).decode()
+            yield f"event: {event}\ndata: {payload}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _to_response(res) -> GetResearchResponse:
+    # res was validated when the agent produced it, so its fields are copied without validating them again
+    return GetResearchResponse.model_construct(
         background_summary=res.grounded_information.background,
         financial_health_summary=res.grounded_information.financial_health,
         market_position_summary=res.grounded_information.market_position,
         positive_aspects=res.positive_aspects,
         negative_aspects=res.negative_aspects
     )
-    
@@ -1,6 +1,6 @@
 import os
 import yaml
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 import logging
 
 class Config(BaseModel):
@@ -8,17 +8,21 @@ class Config(BaseModel):
     
     # LLM configuration
     openai_model: str = Field(description="The model name for the language model.")
+    openai_research_model: str | None = Field(None, description="The model name for the background and topic research agents. Defaults to openai_model.")
     llm_temperature: float = Field(0, description="Temperature setting for the LLM.")
+    llm_max_connections: int = Field(64, description="Maximum number of concurrent connections to the LLM provider.")
+    llm_cache_max_size: int = Field(0, description="Maximum number of cached LLM responses, used only when llm_temperature is 0. 0 disables caching.")
     
     # Other configurations
     max_searches_per_agent: int = Field(3, description="Maximum number of searches per agent.")
+    tavily_max_concurrency: int = Field(8, description="Maximum number of concurrent Tavily requests.")
+    tavily_cache_ttl_seconds: int = Field(0, description="Seconds to reuse Tavily results for identical queries. 0 disables caching.")
 
-    class Config:
-        extra = "forbid"
+    model_config = ConfigDict(extra="forbid")
 
 def load_config() -> Config:
     base_dir = os.path.dirname(os.path.abspath(__file__))
     config_path = os.path.join(base_dir, "config.yaml")
-    logging.info(f"Loading configuration from {config_path}")
+    logging.info("Loading configuration from %s", config_path)
     with open(config_path, "r") as f:
         return Config(**yaml.safe_load(f))
\ No newline at end of file
@@ -1,7 +1,8 @@
 from typing import TypedDict
 from langchain_openai import ChatOpenAI
-from company_researcher.core.api_clients.tavily_client import TavilyBatchSearchInput, TavilyClient
+from company_researcher.core.api_clients.tavily_client import TavilyBatchSearchInput, TavilyClient, format_search_responses
 from langgraph.graph import StateGraph, END, START
+from langgraph.constants import TAG_NOSTREAM
 from langchain_core.messages import HumanMessage, SystemMessage
 from langgraph.graph import MessagesState
 from company_researcher.core.agents.prompts.utils import load_prompt
@@ -28,6 +29,7 @@ class BackgroundAgent:
         
         self.llm = llm
         self.tavily_client = tavily_client
+        self.search_queries_llm = llm.with_structured_output(TavilyBatchSearchInput).with_config(tags=[TAG_NOSTREAM])
         
         self.graph = StateGraph(state_schema=BackgroundResearchState,
                                 input=BackgroundInput,
@@ -63,36 +65,38 @@ class BackgroundAgent:
     
     async def _crawl_and_gather_background(self, state: BackgroundResearchState) -> BackgroundResearchState:
         site_contents = await self.tavily_client.crawl(state["company_url"], max_depth=2, limit=5, instructions=f"Gather background information about the company {state['company_name']}.")
-        site_contents_str = "\n######\n".join([site.to_string() for site in site_contents])
+        site_contents_str = "\n######\n".join(site.to_string() for site in site_contents)
         
         prompt = self.prompts["extract_from_site_content"].format(site_contents_str=site_contents_str, company_name=state["company_name"])
         response = await self.llm.ainvoke([HumanMessage(content=prompt)])
-        response.name = "Researcher"
+        response = response.model_copy(update={"name": "Researcher"})
         return {"messages": [response]} 
 
+    # Node instructions are sent after the conversation: the conversation is shared by every call
+    # of the research, so keeping it first lets the provider serve it from its prompt cache.
     async def _search_and_answer(self, state: BackgroundResearchState) -> BackgroundResearchState:
         generate_search_queries_prompt = self.prompts["generate_search_queries"].format(company_name=state["company_name"])
         
-        search_queries = await self.llm.with_structured_output(TavilyBatchSearchInput).ainvoke([SystemMessage(content=generate_search_queries_prompt)] + state["messages"])
+        search_queries = await self.search_queries_llm.ainvoke(state["messages"] + [SystemMessage(content=generate_search_queries_prompt)])
         search_response = await self.tavily_client.search(search_queries)
-        response_str = "\n########\n".join([res.to_string() for res in search_response])
+        response_str = format_search_responses(search_response)
         
         answer_based_on_search_prompt = self.prompts["answer_based_on_search"].format(response_str=response_str)
 
-        response = await self.llm.ainvoke([SystemMessage(content=answer_based_on_search_prompt)] + state["messages"])
-        response.name = "Researcher"
+        response = await self.llm.ainvoke(state["messages"] + [SystemMessage(content=answer_based_on_search_prompt)])
+        response = response.model_copy(update={"name": "Researcher"})
         return {"messages": [response]}
 
     async def _review(self, state: BackgroundResearchState) -> BackgroundResearchState:
         prompt = self.prompts["review"].format(company_name=state["company_name"])
-        response = await self.llm.ainvoke([SystemMessage(content=prompt)] + state["messages"])
-        response.name = "Reviewer"
+        response = await self.llm.ainvoke(state["messages"] + [SystemMessage(content=prompt)])
+        response = response.model_copy(update={"name": "Reviewer"})
         return {"messages": [response]}
 
     async def _summarize(self, state: BackgroundResearchState) -> BackgroundResearchState:
         prompt = self.prompts["summarize"].format(company_name=state["company_name"])
-        response = await self.llm.ainvoke([SystemMessage(content=prompt)] + state["messages"])
-        response.name = "Background Information Summarizer"
+        response = await self.llm.ainvoke(state["messages"] + [SystemMessage(content=prompt)])
+        response = response.model_copy(update={"name": "Background Information Summarizer"})
         
         return {
             "company_background": response.content,
@@ -1,11 +1,15 @@
+import asyncio
 import operator
-from typing import Annotated, TypedDict
+from collections import OrderedDict
+from functools import partial
+from typing import Annotated, Any, AsyncIterator, TypedDict
 from langchain_openai import ChatOpenAI
 from company_researcher.config.config import Config
 from company_researcher.core.agents import TopicResearchAgent, BackgroundAgent
 from company_researcher.core.api_clients import TavilyClient
 from langgraph.graph import StateGraph, END, START
-from langchain_core.messages import SystemMessage, AIMessage
+from langgraph.constants import TAG_NOSTREAM
+from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from langgraph.graph import MessagesState
 from company_researcher.core.agents.prompts.utils import load_prompt
 from pydantic import BaseModel, Field
@@ -30,74 +34,179 @@ class CompanyResearchState(MessagesState):
     company_url: str
     company_background: str
     results: Annotated[list, operator.add]
+    topic_searches: dict
 
 
 class CompanyResearchAgent:
+    # Compiled graphs keyed by (llm, research llm, tavily client, max searches per agent). Building and
+    # compiling the graph is identical for the same inputs, so instances share one. Each graph pins its
+    # llms and tavily client, so only the most recently used ones are kept.
+    _compiled_graphs: OrderedDict[tuple, StateGraph] = OrderedDict()
+    _compiled_graphs_max_size = 16
+
     def __init__(self,
                  llm:ChatOpenAI,
                  tavily_client:TavilyClient,
-                 config: Config):
-        
+                 config: Config,
+                 research_llm: ChatOpenAI | None = None):
+        """Agent that researches a company and summarizes the findings.
+
+        Args:
+            llm (ChatOpenAI): the llm used for the final summary of the research
+            tavily_client (TavilyClient): the client used for web searches and crawls
+            config (Config): the application configuration
+            research_llm (ChatOpenAI | None): the llm used by the background and topic research agents,
+                which only summarize search results and can run on a cheaper model. Defaults to llm.
+        """
         self.llm = llm
+        self.research_llm = research_llm or llm
         self.tavily_client = tavily_client
+        self.summary_llm = llm.with_structured_output(CompanyResearchOutput).with_config(tags=[TAG_NOSTREAM])
+        
+        self.prompts = {
+            "summarize_results": load_prompt("company_researcher/summarize_results.txt"),
+            "summarize_results_input": load_prompt("company_researcher/summarize_results_input.txt"),
+        }
+        # The summarization instructions never change, so the system message is built once and
+        # sent first on every call, keeping the prompt prefix identical for provider-side caching.
+        self.summarize_system_message = SystemMessage(content=self.prompts["summarize_results"])
         
-        self.graph = StateGraph(state_schema=CompanyResearchState,
-                                input=CompanyResearchInput,
-                                output=CompanyResearchOutput)
-        self.background_agent = BackgroundAgent(llm=self.llm, tavily_client=self.tavily_client)
-        self.financial_health_agent = TopicResearchAgent(
-            llm=self.llm,
+        # The cached graph holds references to the llms and tavily_client, so their ids stay unique while cached.
+        key = (id(llm), id(self.research_llm), id(tavily_client), config.max_searches_per_agent)
+        compiled_graphs = CompanyResearchAgent._compiled_graphs
+        if key in compiled_graphs:
+            compiled_graphs.move_to_end(key)
+        else:
+            compiled_graphs[key] = self._build_graph(config.max_searches_per_agent)
+            if len(compiled_graphs) > CompanyResearchAgent._compiled_graphs_max_size:
+                compiled_graphs.popitem(last=False)
+        self.compiled_graph = compiled_graphs[key]
+        # (company name, company url) -> research in flight, shared by concurrent identical requests
+        self._pending_research: dict[tuple[str, str], asyncio.Task] = {}
+
+    def _build_graph(self, max_steps: int) -> StateGraph:
+        """Build and compile the research graph.
+
+        Args:
+            max_steps (int): Maximum number of searches per topic agent.
+
+        Returns:
+            StateGraph: The compiled state graph.
+        """
+        graph = StateGraph(state_schema=CompanyResearchState,
+                           input=CompanyResearchInput,
+                           output=CompanyResearchOutput)
+        background_agent = BackgroundAgent(llm=self.research_llm, tavily_client=self.tavily_client)
+        financial_health_agent = TopicResearchAgent(
+            llm=self.research_llm,
             tavily_client=self.tavily_client,
             topic_name="Financial Health",
             topic_description="Gather and analyze financial health information for the company, including revenue, expenses, and profitability.",
-            max_steps=config.max_searches_per_agent
+            max_steps=max_steps
         )
-        self.market_position_agent = TopicResearchAgent(
-            llm=self.llm,
+        market_position_agent = TopicResearchAgent(
+            llm=self.research_llm,
             tavily_client=self.tavily_client,
             topic_name="Market Position",
             topic_description="Gather and analyze the company's market position, including its competitors, market share, and industry trends.",
-            max_steps=config.max_searches_per_agent
+            max_steps=max_steps
         )
 
 
-        self.graph.add_node("background_research", self.background_agent.compile())
-        self.graph.add_node("financial_health_research", self.financial_health_agent.compile())
-        self.graph.add_node("market_position_research", self.market_position_agent.compile())
-        self.graph.add_node("summarize_results", self._summarize_results)
+        graph.add_node("search_topics", partial(self._search_topics, [financial_health_agent, market_position_agent]))
+        graph.add_node("background_research", background_agent.compile())
+        graph.add_node("financial_health_research", financial_health_agent.compile())
+        graph.add_node("market_position_research", market_position_agent.compile())
+        graph.add_node("summarize_results", self._summarize_results)
         
-        # Start -> background_research -> (financial_health_research, market_position_research) -> summarize_results -> End
-        self.graph.add_edge(START, "background_research")
-        self.graph.add_edge("background_research", "financial_health_research")
-        self.graph.add_edge("background_research", "market_position_research")
-        self.graph.add_edge("financial_health_research", "summarize_results")
-        self.graph.add_edge("market_position_research", "summarize_results")
-        self.graph.add_edge("summarize_results", END)
+        # Start -> (background_research, search_topics) -> (financial_health_research, market_position_research) -> summarize_results -> End
+        # The topic searches only need the company name, so they run while the background is researched.
+        graph.add_edge(START, "background_research")
+        graph.add_edge(START, "search_topics")
+        graph.add_edge(["background_research", "search_topics"], "financial_health_research")
+        graph.add_edge(["background_research", "search_topics"], "market_position_research")
+        graph.add_edge("financial_health_research", "summarize_results")
+        graph.add_edge("market_position_research", "summarize_results")
+        graph.add_edge("summarize_results", END)
         
-        self.prompts = {
-            "summarize_results": load_prompt("company_researcher/summarize_results.txt"),
-        }
-        
-        self.compiled_graph = self.graph.compile()
+        return graph.compile()
     
     async def perform_research(self, company_name: str, company_url: str) -> CompanyResearchOutput:
-        """Perform company research by invoking the state graph."""
+        """Perform company research by invoking the state graph.
+
+        Concurrent requests for the same company await a single research run instead of each
+        running the whole graph.
+        """
+        key = (company_name.strip().lower(), company_url.strip().lower())
+        task = self._pending_research.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_research(company_name, company_url))
+            self._pending_research[key] = task
+            task.add_done_callback(lambda _: self._pending_research.pop(key, None))
+        # shield so that a disconnected client does not cancel the research for the other clients
+        return await asyncio.shield(task)
+
+    async def _run_research(self, company_name: str, company_url: str) -> CompanyResearchOutput:
         research_input = CompanyResearchInput(
             company_name=company_name,
             company_url=company_url,
         )
         result = await self.compiled_graph.ainvoke(research_input)
-        research_output = CompanyResearchOutput(**result)
+        # The fields were produced and validated by the structured output of summarize_results
+        research_output = CompanyResearchOutput.model_construct(**result)
         return research_output
 
+    async def stream_research(self, company_name: str, company_url: str) -> AsyncIterator[tuple[str, Any]]:
+        """Perform company research, streaming llm tokens and agent results as they are generated.
+
+        Yields:
+            tuple[str, Any]: ("token", {"agent", "node", "content"}) for each generated token,
+                ("step", {"agent", "content"}) with the report of each research agent once it finishes,
+                then ("result", CompanyResearchOutput) once the research is complete.
+        """
+        research_input = CompanyResearchInput(
+            company_name=company_name,
+            company_url=company_url,
+        )
+        result = None
+        async for namespace, mode, data in self.compiled_graph.astream(research_input, stream_mode=["messages", "updates", "values"], subgraphs=True):
+            if namespace and mode != "messages":
+                continue
+            if mode == "values":
+                result = data
+                continue
+            if mode == "updates":
+                for agent, update in data.items():
+                    if agent in ("search_topics", "summarize_results"):
+                        continue
+                    content = update.get("company_background") or "\n".join(msg.content for msg in update.get("results", []))
+                    yield "step", {"agent": agent, "content": content}
+                continue
+            chunk, metadata = data
+            # structured output llms are tagged nostream so their JSON never reaches the client as tokens,
+            # empty chunks carry no text to send
+            if chunk.content:
+                yield "token", {
+                    "agent": namespace[0].split(":")[0] if namespace else None,
+                    "node": metadata.get("langgraph_node"),
+                    "content": chunk.content,
+                }
+        yield "result", CompanyResearchOutput.model_construct(**result)
+
+    async def _search_topics(self, topic_agents: list[TopicResearchAgent], state: CompanyResearchState) -> CompanyResearchState:
+        topic_searches = await asyncio.gather(*(
+            self.tavily_client.search(agent.topic_search_input(state["company_name"])) for agent in topic_agents
+        ))
+        return {"topic_searches": {agent.topic_name: responses for agent, responses in zip(topic_agents, topic_searches)}}
+
     async def _summarize_results(self, state: CompanyResearchState) -> CompanyResearchState:
         background_report = f"Background Research:\n{state['company_background']}\n"
         reports = [background_report] + [msg.content for msg in state['results']]
         reports = "\n####\n".join(reports)
-        prompt = self.prompts["summarize_results"].format(company_name=state["company_name"], reports=reports)
+        prompt = self.prompts["summarize_results_input"].format(company_name=state["company_name"], reports=reports)
         
-        logging.info(f"prompt for summarization:\n{prompt}")
+        logging.debug("prompt for summarization:\n%s", prompt)
         
-        messages = [SystemMessage(content=prompt)]
-        response = await self.llm.with_structured_output(CompanyResearchOutput).ainvoke(messages)
+        messages = [self.summarize_system_message, HumanMessage(content=prompt)]
+        response = await self.summary_llm.ainvoke(messages)
         return response
@@ -1,15 +1,23 @@
+import asyncio
+from collections import OrderedDict
 from typing import TypedDict
 from langchain_openai import ChatOpenAI
-from company_researcher.core.api_clients.tavily_client import TavilyBatchSearchInput, TavilyClient
+from company_researcher.core.api_clients.tavily_client import TavilyBatchSearchInput, TavilyClient, format_search_responses
 from langgraph.graph import StateGraph, END, START
+from langgraph.constants import TAG_NOSTREAM
 from langchain_core.messages import SystemMessage
 from langgraph.graph import MessagesState
 from company_researcher.core.agents.prompts.utils import load_prompt
 import logging
+import re
+
+# The interviewer ends the interview with "Thank you", match it without matching words like "thankless"
+_END_OF_INTERVIEW = re.compile(r"\bthank(s| you)?\b", re.IGNORECASE)
 
 class TopicResearchInput(TypedDict):
     company_name: str
     company_background: str
+    topic_searches: dict
 
 class TopicResearchOutput(TypedDict):
     results: list
@@ -19,9 +27,18 @@ class TopicResearchState(MessagesState):
     company_name: str
     company_background: str
     results: list
+    expert_message_count: int
+    # topic name -> search results for the topic itself, searched ahead of the interview
+    topic_searches: dict
     
     
 class TopicResearchAgent:
+    # Compiled graphs keyed by (llm, tavily client, topic name, topic description, max steps).
+    # Agents built with the same arguments behave identically, so they share one compiled graph.
+    # Each graph pins its llm and tavily client, so only the most recently used ones are kept.
+    _compiled_graphs: OrderedDict[tuple, StateGraph] = OrderedDict()
+    _compiled_graphs_max_size = 16
+
     def __init__(self,
                  llm:ChatOpenAI,
                  tavily_client:TavilyClient,
@@ -41,21 +58,12 @@ class TopicResearchAgent:
         self.topic_name = topic_name
         self.topic_description = topic_description
         self.max_steps = max_steps
-        
-        self.graph = StateGraph(state_schema=TopicResearchState,
-                                input=TopicResearchInput,
-                                output=TopicResearchOutput)
-        
-        self.graph.add_node("ask_question", self._ask_question)
-        self.graph.add_node("search_web_and_answer", self._search_web_and_answer)
-        self.graph.add_node("summarize_results", self._summarize_results)
-        
-        self.graph.add_edge(START, "ask_question")
-        self.graph.add_conditional_edges("ask_question", self.route_to_search_or_summarize, ["search_web_and_answer", "summarize_results"])
-        self.graph.add_edge("search_web_and_answer", "ask_question")
-        self.graph.add_edge("summarize_results", END)
+        # Interviewer questions are short, capping them bounds the decode time of each step
+        self.question_llm = llm.bind(max_tokens=256)
+        self.search_queries_llm = llm.with_structured_output(TavilyBatchSearchInput).with_config(tags=[TAG_NOSTREAM])
         
         self.prompts = {
+            "context": load_prompt("research_topic_interviewer/context.txt"),
             "summarize_results": load_prompt("research_topic_interviewer/summarize_results.txt"),
             "ask_question": load_prompt("research_topic_interviewer/ask_question.txt"),
             "generate_search_queries": load_prompt("research_topic_interviewer/generate_search_queries.txt"),
@@ -65,11 +73,70 @@ class TopicResearchAgent:
     def compile(self) -> StateGraph:
         """Compile the state graph for the agent.
 
+        The compiled graph is shared with every agent created with the same arguments.
+
         Returns:
             StateGraph: The compiled state graph.
         """
-        return self.graph.compile()
+        # The cached graph holds references to llm and tavily_client, so their ids stay unique while cached.
+        key = (id(self.llm), id(self.tavily_client), self.topic_name, self.topic_description, self.max_steps)
+        compiled_graphs = TopicResearchAgent._compiled_graphs
+        if key in compiled_graphs:
+            compiled_graphs.move_to_end(key)
+        else:
+            compiled_graphs[key] = self._build_graph().compile()
+            if len(compiled_graphs) > TopicResearchAgent._compiled_graphs_max_size:
+                compiled_graphs.popitem(last=False)
+        return compiled_graphs[key]
+
+    def _build_graph(self) -> StateGraph:
+        graph = StateGraph(state_schema=TopicResearchState,
+                           input=TopicResearchInput,
+                           output=TopicResearchOutput)
+        
+        graph.add_node("ask_question", self._ask_question)
+        graph.add_node("search_web_and_answer", self._search_web_and_answer)
+        graph.add_node("summarize_results", self._summarize_results)
+        
+        graph.add_edge(START, "ask_question")
+        graph.add_conditional_edges("ask_question", self.route_to_search_or_summarize, ["search_web_and_answer", "summarize_results"])
+        graph.add_edge("search_web_and_answer", "ask_question")
+        graph.add_edge("summarize_results", END)
+        return graph
         
+    def topic_search_input(self, company_name: str) -> TavilyBatchSearchInput:
+        """Build the search for the topic itself, the first search of every interview.
+
+        It depends only on the company name, so it can run before the interview starts.
+
+        Args:
+            company_name (str): The name of the company.
+
+        Returns:
+            TavilyBatchSearchInput: The topic search.
+        """
+        return TavilyBatchSearchInput(queries=[f"{company_name} {self.topic_name}"])
+
+    def _context_message(self, state: TopicResearchState) -> SystemMessage:
+        """Build the research context shared by every llm call of the interview.
+
+        It is sent as the first message of each call, followed by the conversation and only then by
+        the instructions of the current node, so that the prompt prefix is shared by all the steps
+        of an interview and can be served from the provider's prompt cache.
+
+        Args:
+            state (TopicResearchState): The current state of the research.
+
+        Returns:
+            SystemMessage: The context message.
+        """
+        return SystemMessage(content=self.prompts["context"].format(
+            company_name=state["company_name"],
+            topic_name=self.topic_name,
+            topic_description=self.topic_description,
+            company_background=state["company_background"]
+        ))
+
     async def _summarize_results(self, state: TopicResearchState) -> TopicResearchState:
         """Summarize the results of the research.
 
@@ -81,14 +148,13 @@ class TopicResearchAgent:
         """
         prompt_for_summarizing_results = self.prompts["summarize_results"].format(
             topic_name=self.topic_name,
-            topic_description=self.topic_description,
-            company_name=state["company_name"],
-            company_background=state["company_background"]
+            company_name=state["company_name"]
         )
 
-        summary = await self.llm.ainvoke([SystemMessage(content=prompt_for_summarizing_results)] + state["messages"])
-        summary.content = f"Summary of {self.topic_name} research for {state['company_name']}:\n{summary.content}"
-        logging.info(f"Summary for {self.topic_name} research:\n{summary.content}")
+        summary = await self.llm.ainvoke([self._context_message(state)] + state["messages"] + [SystemMessage(content=prompt_for_summarizing_results)])
+        # The llm may return its cached message, copy it instead of changing it in place
+        summary = summary.model_copy(update={"content": f"Summary of {self.topic_name} research for {state['company_name']}:\n{summary.content}"})
+        logging.info("Summary for %s research:\n%s", self.topic_name, summary.content)
         return {"results": [summary]}
         
     def route_to_search_or_summarize(self, state: TopicResearchState) -> str:
@@ -100,14 +166,12 @@ class TopicResearchAgent:
         Returns:
             str: The next step in the workflow, either "search_web" or "summarize_results".
         """
-        # count the number of messages sent by the expert
-        expert_messages = [msg for msg in state["messages"] if msg.name == "Expert"]
         last_interviewer_message = state["messages"][-1].content if state["messages"] else None
-        if len(expert_messages) >= self.max_steps:
-            logging.info(f"Maximum steps reached for {self.topic_name} research. Summarizing results.")
+        if state.get("expert_message_count", 0) >= self.max_steps:
+            logging.info("Maximum steps reached for %s research. Summarizing results.", self.topic_name)
             return "summarize_results"
-        elif "thank" in last_interviewer_message.lower():
-            logging.info(f"Interviewer asked to finish the interview.")
+        elif _END_OF_INTERVIEW.search(last_interviewer_message):
+            logging.info("Interviewer asked to finish the interview.")
             return "summarize_results"
         else:
             return "search_web_and_answer"
@@ -121,16 +185,19 @@ class TopicResearchAgent:
         Returns:
             TopicResearchState: _description_
         """
+        if state.get("expert_message_count", 0) >= self.max_steps:
+            # The interview is going to be summarized regardless of the next question. No message is added,
+            # a generated one would get a new id each run and keep the summary prompt out of the llm cache.
+            return {}
+        
         prompt_for_researcher = self.prompts["ask_question"].format(
             company_name=state["company_name"],
-            topic_name=self.topic_name,
-            topic_description=self.topic_description,
-            company_background=state["company_background"]
+            topic_name=self.topic_name
         )
         messages = state["messages"]
         
-        question = await self.llm.ainvoke([SystemMessage(content=prompt_for_researcher)] + messages)
-        question.name = "Interviewer"
+        question = await self.question_llm.ainvoke([self._context_message(state)] + messages + [SystemMessage(content=prompt_for_researcher)])
+        question = question.model_copy(update={"name": "Interviewer"})
         
         return {"messages": [question]}
     
@@ -145,32 +212,33 @@ class TopicResearchAgent:
         """
         # This should be replaced with the actual logic to search the web
         
-        prompt_asking_for_search_queries = self.prompts["generate_search_queries"].format(
-            company_name=state["company_name"],
-            topic_name=self.topic_name,
-            topic_description=self.topic_description,
-            company_background=state["company_background"]
-        )
+        context_message = self._context_message(state)
+        prompt_asking_for_search_queries = self.prompts["generate_search_queries"]
 
-        search_queries = await self.llm.with_structured_output(TavilyBatchSearchInput).ainvoke([SystemMessage(content=prompt_asking_for_search_queries)] + state["messages"])
+        generate_queries = self.search_queries_llm.ainvoke([context_message] + state["messages"] + [SystemMessage(content=prompt_asking_for_search_queries)])
         
-        # TODO - async all the way, make the graph async
-        tavily_responses = await self.tavily_client.search(search_queries)
+        prefetched_topic_responses = state.get("topic_searches", {}).get(self.topic_name)
+        if state.get("expert_message_count", 0) == 0 and prefetched_topic_responses is not None:
+            search_queries, topic_responses = await generate_queries, prefetched_topic_responses
+        elif state.get("expert_message_count", 0) == 0:
+            # On the first step, search the topic itself while the llm is still generating queries.
+            topic_search_input = self.topic_search_input(state["company_name"])
+            search_queries, topic_responses = await asyncio.gather(generate_queries, self.tavily_client.search(topic_search_input))
+        else:
+            search_queries, topic_responses = await generate_queries, []
+        
+        tavily_responses = topic_responses + await self.tavily_client.search(search_queries)
 
-        search_results = "\n########\n".join([res.to_string() for res in tavily_responses])
+        search_results = format_search_responses(tavily_responses)
         if not search_results:
             raise ValueError("No search results found. Please try again with different queries.")
 
         prompt_for_asking_to_answer_questions_based_on_search_results = self.prompts["answer_based_on_search_results"].format(
-            company_name=state["company_name"],
-            topic_name=self.topic_name,
-            topic_description=self.topic_description,
-            company_background=state["company_background"],
             search_results=search_results
         )
-        messages = [SystemMessage(content=prompt_for_asking_to_answer_questions_based_on_search_results)] + state["messages"]
+        messages = [context_message] + state["messages"] + [SystemMessage(content=prompt_for_asking_to_answer_questions_based_on_search_results)]
         
         answer = await self.llm.ainvoke(messages)
-        answer.name = "Expert" 
+        answer = answer.model_copy(update={"name": "Expert"})
         
-        return {"messages": [answer]}
+        return {"messages": [answer], "expert_message_count": state.get("expert_message_count", 0) + 1}
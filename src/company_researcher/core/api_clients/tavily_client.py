@@ -3,13 +3,20 @@ Tavily API client for web search functionality.
 """
 
 import asyncio
+from collections import OrderedDict
+import json
 import os
-from pydantic import BaseModel, Field
+import time
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
 from tavily import AsyncTavilyClient
 import logging
 import re
 
+# Markdown links [text](url) or standalone http(s) URLs, removed in a single pass
+_MD_LINK_OR_URL = re.compile(r"\[.*?\]\(.*?\)|https?://\S+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
 
 class TavilyBatchSearchInput(BaseModel):
     queries: List[str] = Field(description="List of search queries to perform.")
@@ -18,11 +25,12 @@ class PageContent(BaseModel):
     url: str = Field(description="The URL to crawl.")
     raw_content: str = Field(description="The content of the page to be crawled.")
     
-    def to_string(self) -> str:
-        return f"URL: {self.url}\nRaw Content: {self.raw_content}"
+    def to_string(self, max_content_chars: int = 4000) -> str:
+        # Crawled pages can be arbitrarily long, cap each one to bound the prompt size.
+        # Unlike search snippets the content is sliced rather than shortened, to keep its line structure.
+        return f"URL: {self.url}\nRaw Content: {self.raw_content[:max_content_chars]}"
     
-    class Config:
-        allow_population_by_field_name = True
+    model_config = ConfigDict(populate_by_name=True)
         
 class ResultCandidate(BaseModel):
     title: str = Field(description="The title of the search result.")
@@ -30,45 +38,82 @@ class ResultCandidate(BaseModel):
     content: str = Field(description="A short description of the search result.")
     score: float = Field(description="Relevance score of the search result.")
     
-    class Config:
-        allow_population_by_field_name = True
+    model_config = ConfigDict(populate_by_name=True)
         
 class SearchResponse(BaseModel):
     query: str = Field(description="The search query used.")
     answer: Optional[str] = Field(default=None, description="The answer to the search query.")
     candidates: List[ResultCandidate] = Field(alias="results",description="List of search results.")
     
-    def to_string(self, top_k_candidates: int = 3) -> str:
+    def to_string(self, top_k_candidates: int = 3, max_content_chars: int = 500, seen_urls: Optional[set] = None) -> str:
+        """
+        Format the response for an llm prompt.
+        
+        Args:
+            top_k_candidates: Number of highest scoring results to include.
+            max_content_chars: Result snippets longer than this are shortened.
+            seen_urls: URLs already included in the prompt, results with these URLs are skipped.
+                URLs included by this response are added to it.
+        """
         info = []
         if self.query:
             info.append(f"Query: {self.query}")
         if self.answer:
             info.append(f"Snippet: {self.answer}")
-        if self.candidates:
+        candidates = sorted(self.candidates, key=lambda x: x.score, reverse=True)
+        if seen_urls is not None:
+            candidates = [c for c in candidates if c.url not in seen_urls]
+        candidates = candidates[:top_k_candidates]
+        if candidates:
             info.append("Results:")
-            for result in sorted(self.candidates, key=lambda x: x.score, reverse=True)[:top_k_candidates]:
+            for result in candidates:
                 info.append(f"- {result.title} ({result.url})")
                 if result.content:
-                    info.append(f"  Snippet: {result.content}")
-                if result.score:
-                        info.append(f"  Score: {result.score:.2f}")
+                    # Sliced rather than shortened at word boundaries, which drops the whole snippet
+                    # when it has no spaces (e.g. CJK text)
+                    snippet = result.content if len(result.content) <= max_content_chars else result.content[:max_content_chars] + "..."
+                    info.append(f"  Snippet: {snippet}")
+                if seen_urls is not None:
+                    seen_urls.add(result.url)
             
         return '\n'.join(info)
 
-    class Config:
-        allow_population_by_field_name = True
+    model_config = ConfigDict(populate_by_name=True)
+
+def format_search_responses(responses: List[SearchResponse], separator: str = "\n########\n") -> str:
+    """
+    Format search responses for an llm prompt, keeping the prompt small.
+    
+    Results already included for an earlier query are skipped, and only the top 2 results
+    per query are kept when the batch returned more than 10 results overall.
+    """
+    top_k_candidates = 2 if sum(len(res.candidates) for res in responses) > 10 else 3
+    seen_urls = set()
+    return separator.join(res.to_string(top_k_candidates=top_k_candidates, seen_urls=seen_urls) for res in responses)
 
 class TavilyClient:
     """
     A simple client for interacting with the Tavily search API.
     """
     
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 8, cache_ttl_seconds: int = 0, cache_max_size: int = 1024):
         """
         Initialize the Tavily client.
+        
+        Args:
+            max_concurrency: Maximum number of Tavily requests in flight at once.
+            cache_ttl_seconds: How long search results are reused for identical queries. 0 disables caching.
+            cache_max_size: Maximum number of cached search results, least recently used are evicted first.
         """
         self.api_key = os.getenv("TAVILY_API_KEY")
         self.async_client = AsyncTavilyClient(api_key=self.api_key)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.cache_max_size = cache_max_size
+        # (query, search kwargs) -> (expiry time, raw Tavily response)
+        self._search_cache: OrderedDict[tuple, tuple[float, dict]] = OrderedDict()
+        # (query, search kwargs) -> request in flight, shared by concurrent identical searches
+        self._pending_searches: dict[tuple, asyncio.Task] = {}
         
         if not self.api_key:
             logging.error("TAVILY_API_KEY not found in environment variables")
@@ -84,22 +129,23 @@ class TavilyClient:
         Returns:
             List of dicts containing the crawled data.
         """
-        logging.info(f"Starting crawl for URL: {url}")
+        logging.info("Starting crawl for URL: %s", url)
         
-        res = await self.async_client.crawl(url=url, max_depth=max_depth, limit=limit, instructions=instructions)
+        async with self.semaphore:
+            res = await self.async_client.crawl(url=url, max_depth=max_depth, limit=limit, instructions=instructions)
         
-        logging.info(f"Crawl completed for URL: {url}")
-        logging.debug(f"Crawl result: {res}")
+        logging.info("Crawl completed for URL: %s", url)
+        logging.debug("Crawl result: %s", res)
         
         pages = []
         for d in res.get('results', []):
             raw = d.get('raw_content', '')
-            logging.info(f"Raw content length: {len(raw)}")
+            logging.info("Raw content length: %s", len(raw))
             cleaned = TavilyClient._clean_raw_content(raw)
-            logging.info(f"Cleaned content length: {len(cleaned)}")
+            logging.info("Cleaned content length: %s", len(cleaned))
             pages.append(PageContent(url=d.get('url', ''), raw_content=cleaned))
 
-        logging.info(f"Extracted {len(pages)} pages from crawl.")
+        logging.info("Extracted %s pages from crawl.", len(pages))
         return pages
 
     async def search(self, batch_search_input: TavilyBatchSearchInput, **kwargs) -> List[SearchResponse]:
@@ -113,22 +159,61 @@ class TavilyClient:
             Dict containing the search results from Tavily API.
         """
         
-        logging.info(f"Starting search for {len(batch_search_input.queries)} queries.")
+        # Skip empty and repeated queries (ignoring case and whitespace), they would only pay for no results
+        # or for the same results twice
+        normalized_queries = (TavilyClient._normalize_query(query) for query in batch_search_input.queries)
+        queries = list(dict.fromkeys(query for query in normalized_queries if query))
+        logging.info("Starting search for %s queries.", len(queries))
         
         results = await asyncio.gather(
-            *[self.async_client.search(query=query, include_answer=True, **kwargs) for query in batch_search_input.queries]
+            *[self._search_one(query, **kwargs) for query in queries]
         )
         
-        logging.info(f"Search completed, got {len(results)} results.")
+        logging.info("Search completed, got %s results.", len(results))
         
-        return [SearchResponse(**res) for res in results if res]
+        return [SearchResponse.model_validate(res) for res in results if res]
+
+    async def _search_one(self, query: str, **kwargs) -> dict:
+        key = (query, json.dumps(kwargs, sort_keys=True, default=str))
+        cached = self._search_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            logging.info("Using cached search results for query: %s", query)
+            self._search_cache.move_to_end(key)
+            return cached[1]
+
+        task = self._pending_searches.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_search(key, query, **kwargs))
+            self._pending_searches[key] = task
+            task.add_done_callback(lambda _: self._pending_searches.pop(key, None))
+        # shield so that a cancelled caller does not cancel the search for the other callers
+        return await asyncio.shield(task)
+
+    async def _fetch_search(self, key: tuple, query: str, **kwargs) -> dict:
+        async with self.semaphore:
+            res = await self.async_client.search(query=query, include_answer=TavilyClient._needs_answer(query), **kwargs)
+
+        if self.cache_ttl_seconds > 0 and res:
+            self._search_cache[key] = (time.monotonic() + self.cache_ttl_seconds, res)
+            self._search_cache.move_to_end(key)
+            if len(self._search_cache) > self.cache_max_size:
+                self._search_cache.popitem(last=False)
+        return res
+
+    @staticmethod
+    def _needs_answer(query: str) -> bool:
+        # Tavily's generated answer adds latency and cost, it only helps open-ended queries.
+        # Short factual queries (numbers, dates, names) are answered by the results themselves.
+        return len(query.split()) > 6 or query.endswith("?")
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join(query.lower().split())
 
     @staticmethod
     def _clean_raw_content(text: str) -> str:
-        # 1) Remove Markdown links [text](url)
-        text = re.sub(r"\[.*?\]\(.*?\)", "", text)
-        # 2) Remove any standalone http(s) URLs
-        text = re.sub(r"https?://\S+", "", text)
-        # 3) Collapse multiple blank lines into one
-        text = re.sub(r"\n\s*\n+", "\n\n", text)
+        # 1) Remove Markdown links [text](url) and standalone http(s) URLs
+        text = _MD_LINK_OR_URL.sub("", text)
+        # 2) Collapse multiple blank lines into one
+        text = _BLANK_LINES.sub("\n\n", text)
         return text.strip()
\ No newline at end of file
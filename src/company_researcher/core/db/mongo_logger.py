@@ -1,19 +1,64 @@
-from pymongo.mongo_client import MongoClient
+import asyncio
+from pymongo import AsyncMongoClient
 from pymongo.server_api import ServerApi
 import os
-from datetime import datetime
+import logging
+from datetime import datetime, timezone
 
 class MongoLogger:
-    def __init__(self):
+    def __init__(self, batch_size: int = 50, flush_interval_seconds: float = 2.0):
+        """Logs research results to MongoDB without blocking the event loop.
+
+        Results are buffered and written with insert_many once batch_size results are
+        pending, or flush_interval_seconds after the first pending result, whichever comes first.
+        """
         uri = os.getenv("MONGO_URI")
-        self.client = MongoClient(uri, server_api=ServerApi('1'))
+        self.client = AsyncMongoClient(uri, server_api=ServerApi('1'))
         self.db = self.client["company_research"]
         self.collection = self.db["research_logs"]
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self._buffer: list[dict] = []
+        self._lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
 
-    def log_result(self, company_name: str, company_url: str, result: dict):
-        self.collection.insert_one({
+    async def log_result(self, company_name: str, company_url: str, result: dict):
+        self._buffer.append({
             "company_name": company_name,
             "company_url": company_url,
             "result": result,
-            "timestamp": datetime.utcnow()
-        })
\ No newline at end of file
+            "timestamp": datetime.now(timezone.utc)
+        })
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        """Write all buffered results to MongoDB."""
+        async with self._lock:
+            if not self._buffer:
+                return
+            documents, self._buffer = self._buffer, []
+            try:
+                await self.collection.insert_many(documents, ordered=False)
+            except Exception:
+                logging.exception("Failed to write %s research logs to MongoDB", len(documents))
+
+    async def close(self):
+        """Flush pending results and close the MongoDB client."""
+        if self._flush_task is not None and not self._flush_task.done():
+            # Stop it from waiting out its interval, the results it is waiting to write are flushed below.
+            # If it is already writing, the write is shielded and the flush below waits for it on the lock.
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        await self.client.close()
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval_seconds)
+        # flush() takes the results out of the buffer before writing them, cancelling it would lose them
+        await asyncio.shield(self.flush())